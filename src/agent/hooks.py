@@ -26,20 +26,17 @@ def pre_finalize_guard(state: Dict[str, Any]) -> Dict[str, Any]:
     required_types = set(redaction_cfg.get("required_types", []))
     if required_types:
         findings = state.get("pii_findings") or []
-        required_findings = [f for f in findings if (f or {}).get("pii_type") in required_types]
+        required_findings = [f for f in findings if f.pii_type in required_types]
         if required_findings:
-            proposals = state.get("redaction_proposals") or []
+            by_key = state.get("proposals_by_key")
+            if not by_key:
+                by_key = {(p.artifact_id, p.start, p.end): p for p in state.get("redaction_proposals") or []}
             selected_ids = set((state.get("approvals") or {}).get("selected_proposals") or [])
-            selected_by_key = {
-                ((p or {}).get("artifact_id"), int((p or {}).get("start", 0)), int((p or {}).get("end", 0))): p
-                for p in proposals
-                if (p or {}).get("id") in selected_ids and (p or {}).get("pii_type") in required_types
-            }
-            missing_required: int = 0
-            for f in required_findings:
-                key = ((f or {}).get("artifact_id"), int((f or {}).get("start", 0)), int((f or {}).get("end", 0)))
-                if key not in selected_by_key:
-                    missing_required += 1
+            missing_required: int = sum(
+                1
+                for f in required_findings
+                if (p := by_key.get((f.artifact_id, f.start, f.end))) is None or p.id not in selected_ids
+            )
             if missing_required > 0:
                 allow_override = bool(redaction_cfg.get("allow_override_with_justification"))
                 justification = ((state.get("approvals") or {}).get("compliance") or {}).get("justification", "")
@@ -1,58 +1,65 @@
 from __future__ import annotations
 
+import functools
 import os
-from typing import Any, Dict
+from typing import Any, Dict, Tuple
 
-try:
-    from portia.config import Config, LLMModel, LLMProvider  # type: ignore
-    from portia.portia import Portia  # type: ignore
-except Exception:  # pragma: no cover
-    Config = None
-    LLMProvider = None
-    LLMModel = None
-    Portia = None
+from src.agent.portia_orchestrator import PORTIA_INSTALLED, _gemini_portia, _portia
+
+
+@functools.lru_cache(maxsize=128)
+def _deterministic_summary(artifacts: int, cats: Tuple[str, ...], policy: Tuple[str, ...]) -> str:
+    return "\n".join([
+        f"Artifacts: {artifacts}",
+        f"PII categories: {', '.join(cats) if cats else 'none'}",
+        f"Policy sections required: {', '.join(policy)}",
+        "Recommendation: Approve if redactions selected; otherwise justify overrides.",
+    ])
+
+
+@functools.lru_cache(maxsize=512)
+def _cached_run(client: Any, prompt: str) -> str:
+    # The prompt is built only from the summarization inputs, so it is an exact-match key.
+    # Only the summary text is cached: a serialized PlanRun would leak one DSAR's run id and
+    # trace into another's approvals. Failures raise and are therefore never cached.
+    final = client.run(prompt).outputs.final_output
+    if final is None:
+        raise RuntimeError("LLM run produced no final output")
+    return str(final.get_value())
 
 
 class PortiaLLM:
     def __init__(self) -> None:
         self.available = False
-        if Config is None:
+        if not PORTIA_INSTALLED:
             return
         # Ensure GOOGLE_API_KEY is set for Gemini
         if not os.environ.get("GOOGLE_API_KEY"):
             return
-        # Use Gemini provider + a lightweight model for responsiveness
-        cfg = Config.from_default(
-            llm_provider=LLMProvider.GOOGLE_GENERATIVE_AI,
-            llm_model_name=LLMModel.GEMINI_2_0_FLASH,
-        )
-        self.client = Portia(config=cfg)
+        try:
+            _, LLMProvider, LLMModel, _ = _portia()
+        except Exception:  # pragma: no cover
+            return
+        # Use Gemini provider + a lightweight model for responsiveness; the client is shared per process
+        self.client = _gemini_portia(LLMProvider.GOOGLE_GENERATIVE_AI, LLMModel.GEMINI_2_0_FLASH)
         self.available = True
 
     def summarize(self, state: Dict[str, Any]) -> str:
+        """Summarize the review; identical inputs reuse an earlier LLM response."""
         # In Cloud mode or when LLM unavailable, return a deterministic local summary to avoid SDK planning errors.
         if not self.available or os.environ.get("PORTIA_API_KEY"):
             artifacts = len(state.get("artifacts", []))
-            cats = sorted({f.get("pii_type") for f in state.get("pii_findings", []) if f.get("pii_type")})
-            risks = []
-            policy = list((state.get("policy") or {}).get("disclosure", {}).get("require_sections", []))
-            if not cats:
-                risks.append("No PII detected (verify sources)")
-            return (
-                f"Artifacts: {artifacts}\n"
-                f"PII categories: {', '.join(cats) if cats else 'none'}\n"
-                f"Policy sections required: {', '.join(policy)}\n"
-                "Recommendation: Approve if redactions selected; otherwise justify overrides."
-            )
+            cats = tuple(sorted({f.pii_type for f in state.get("pii_findings", []) if f.pii_type}))
+            policy = tuple((state.get("policy") or {}).get("disclosure", {}).get("require_sections", []))
+            return _deterministic_summary(artifacts, cats, policy)
         prompt = (
             "Summarize a GDPR DSAR disclosure review. Include: number of artifacts, PII categories, any risks, and a concise recommendation.\n"
             f"Artifacts: {len(state.get('artifacts', []))}\n"
-            f"PII categories: {sorted({f.get('pii_type') for f in state.get('pii_findings', [])})}\n"
+            f"PII categories: {sorted({f.pii_type for f in state.get('pii_findings', [])})}\n"
             f"Policy: {list((state.get('policy') or {}).get('disclosure', {}).get('require_sections', []))}\n"
         )
         try:
-            plan_run = self.client.run(prompt)
-            return plan_run.model_dump_json()
+            return _cached_run(self.client, prompt)
         except Exception as e:  # pragma: no cover
             return f"LLM error: {e}"
 
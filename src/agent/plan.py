@@ -1,23 +1,100 @@
 from __future__ import annotations
 
-from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional
-from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
 import os
+import re
+import threading
 
 from src.tools.pdfzip_tool import write_disclosure_zip
-from src.tools.filesystem_tool import read_json, list_files
-from src.tools.pii_tool import detect as detect_pii_text, mask_value
+from src.tools.filesystem_tool import iter_json_items, read_json, list_files
+from src.tools.pii_tool import detect_batch as detect_pii_batch, mask_value
 from src.tools.gmail_tool import GmailTool
 
+# Optional C ISO-8601 parser; stdlib parsing is used if unavailable
+try:  # pragma: no cover
+    import ciso8601  # type: ignore
+except Exception:  # pragma: no cover
+    ciso8601 = None  # type: ignore
 
-@dataclass
+
+_NON_DIGIT_RE = re.compile(r"\D")
+
+
+def _phone_key(value: str) -> str:
+    """Normalize a phone number to its digits so formatting differences still match."""
+    return _NON_DIGIT_RE.sub("", value)
+
+
+def _parse_iso8601(date_str: str) -> datetime:
+    if ciso8601 is not None:
+        return ciso8601.parse_datetime(date_str)
+    # Support ISO8601 with a trailing 'Z'; only rewrite when it is actually present
+    if date_str.endswith("Z"):
+        date_str = date_str[:-1] + "+00:00"
+    return datetime.fromisoformat(date_str)
+
+
+@lru_cache(maxsize=4096)
+def _mask(pii_type: str, value: str) -> str:
+    # The same email/phone typically recurs across many artifacts
+    return mask_value(pii_type, value)
+
+
+def _read_file_artifact(fp: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(fp, "r", encoding="utf-8", errors="ignore") as f:
+            text = f.read()
+    except Exception:
+        return None
+    return {
+        "source": "files",
+        "id": os.path.basename(fp),
+        "type": "file",
+        "content": text,
+    }
+
+
+@dataclass(slots=True)
+class PiiFinding:
+    artifact_id: str
+    pii_type: str
+    value: str
+    start: int
+    end: int
+    confidence: float
+    third_party: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True)
+class RedactionProposal:
+    id: str
+    artifact_id: str
+    pii_type: str
+    value: str
+    masked_preview: str
+    start: int
+    end: int
+    action: str = "mask"
+    third_party: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+@dataclass(slots=True, frozen=True)
 class Clarification:
     type: str
     payload: Dict[str, Any]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class PlanStepResult:
     step: str
     success: bool
@@ -31,8 +108,14 @@ class PlanRunState:
     subject_email: str
     request_types: List[str]
     artifacts: List[Dict[str, Any]] = field(default_factory=list)
-    pii_findings: List[Dict[str, Any]] = field(default_factory=list)
-    redaction_proposals: List[Dict[str, Any]] = field(default_factory=list)
+    pii_findings: List[PiiFinding] = field(default_factory=list)
+    # Same findings as pii_findings, bucketed by artifact_id in artifact order
+    pii_findings_by_artifact: Dict[str, List[PiiFinding]] = field(default_factory=dict, repr=False)
+    redaction_proposals: List[RedactionProposal] = field(default_factory=list)
+    # (artifact_id, start, end) -> proposal; rebuilt whenever redaction_proposals is replaced
+    proposals_by_key: Dict[Tuple[str, int, int], RedactionProposal] = field(default_factory=dict, repr=False)
+    # (subject_email, identity, identifiers) from the last GDPRPlan._known_subject_identifiers call
+    subject_ids_cache: Optional[Tuple[str, Dict[str, Any], Dict[str, frozenset]]] = field(default=None, repr=False)
     approvals: Dict[str, Any] = field(default_factory=dict)
     policy: Dict[str, Any] = field(default_factory=dict)
     identity: Dict[str, Any] = field(default_factory=dict)
@@ -41,22 +124,67 @@ class PlanRunState:
     disclosures: Dict[str, Any] = field(default_factory=dict)
     delivery: Dict[str, Any] = field(default_factory=dict)
     erasure: Dict[str, Any] = field(default_factory=dict)
+    # Sorted distinct values, derived once by collect_artifacts / detect_pii
+    artifact_types: Tuple[str, ...] = ()
+    pii_categories: Tuple[str, ...] = ()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-ready snapshot; derived indexes and caches are left out and rebuilt by from_dict."""
+        data = {f.name: getattr(self, f.name) for f in fields(self) if f.name not in _DERIVED_STATE_FIELDS}
+        data["pii_findings"] = [f.as_dict() for f in self.pii_findings]
+        data["redaction_proposals"] = [p.as_dict() for p in self.redaction_proposals]
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> PlanRunState:
+        names = {f.name for f in fields(cls)} - _DERIVED_STATE_FIELDS
+        state = cls(**{k: v for k, v in data.items() if k in names})
+        state.pii_findings = [PiiFinding(**f) for f in state.pii_findings]
+        state.redaction_proposals = [RedactionProposal(**p) for p in state.redaction_proposals]
+        state.artifact_types = tuple(state.artifact_types)
+        state.pii_categories = tuple(state.pii_categories)
+        by_artifact: Dict[str, List[PiiFinding]] = {}
+        for f in state.pii_findings:
+            by_artifact.setdefault(f.artifact_id, []).append(f)
+        state.pii_findings_by_artifact = by_artifact
+        state.proposals_by_key = {(p.artifact_id, p.start, p.end): p for p in state.redaction_proposals}
+        return state
+
+
+_DERIVED_STATE_FIELDS = frozenset({"pii_findings_by_artifact", "proposals_by_key", "subject_ids_cache"})
 
 
 class GDPRPlan:
     def __init__(self, state: PlanRunState):
         self.state = state
         self.clarifications: List[Clarification] = []
+        self._gmail_tool: Optional[GmailTool] = None
+        self._gmail_lock = threading.Lock()
 
     def log(self, step: str, detail: Dict[str, Any]) -> None:
         self.state.audit_log.append({"step": step, **detail})
 
     # --- Helpers ---
-    def _known_subject_identifiers(self) -> Dict[str, set]:
+    @property
+    def _gmail(self) -> GmailTool:
+        """GmailTool shared by the steps of this plan; built on first use (auth + API client)."""
+        if self._gmail_tool is None:
+            with self._gmail_lock:
+                if self._gmail_tool is None:
+                    self._gmail_tool = GmailTool()
+        return self._gmail_tool
+
+    def _known_subject_identifiers(self) -> Dict[str, frozenset]:
         """Return known identifiers for the data subject to distinguish third-party PII.
 
         Includes email(s) and phone(s) from state and CRM profile if available.
+        Emails are lowercased and phones reduced to digits once here, so callers
+        can test membership without re-normalizing the stored values. The result is
+        cached on the state until the subject email or identity dict is replaced.
         """
+        cached = self.state.subject_ids_cache
+        if cached is not None and cached[0] == self.state.subject_email and cached[1] is self.state.identity:
+            return cached[2]
         emails: set = set()
         phones: set = set()
         # Subject email from request
@@ -67,7 +195,7 @@ class GDPRPlan:
             crm = read_json(os.path.join("data", "crm_profile.json"))
             if isinstance(crm, dict):
                 e = str(crm.get("email") or "").strip().lower()
-                p = str(crm.get("phone") or "").strip()
+                p = _phone_key(str(crm.get("phone") or ""))
                 if e:
                     emails.add(e)
                 if p:
@@ -77,12 +205,14 @@ class GDPRPlan:
         # Also check any identity hints previously stored
         ident = self.state.identity or {}
         e2 = str(ident.get("email") or "").strip().lower()
-        p2 = str(ident.get("phone") or "").strip()
+        p2 = _phone_key(str(ident.get("phone") or ""))
         if e2:
             emails.add(e2)
         if p2:
             phones.add(p2)
-        return {"emails": emails, "phones": phones}
+        ids = {"emails": frozenset(emails), "phones": frozenset(phones)}
+        self.state.subject_ids_cache = (self.state.subject_email, self.state.identity, ids)
+        return ids
 
     def verify_identity(self) -> PlanStepResult:
         # Heuristic confidence from precomputed value or fallback
@@ -120,7 +250,7 @@ class GDPRPlan:
         ]
         # If Gmail tool available, note live Gmail as a source
         try:
-            gmail = GmailTool()
+            gmail = self._gmail
             if gmail.available:
                 sources.append({"name": "gmail_live", "path": "gmail:label_or_query"})
         except Exception:
@@ -128,12 +258,11 @@ class GDPRPlan:
         self.log("discover_sources", {"sources": sources})
         return PlanStepResult(step="discover_sources", success=True, data={"sources": sources})
 
-    def collect_artifacts(self) -> PlanStepResult:
+    def _load_gmail_export(self) -> List[Dict[str, Any]]:
         artifacts: List[Dict[str, Any]] = []
         # Try to load demo data; fallback to inline samples
         try:
-            gmail = read_json(os.path.join("data", "gmail_export.json"))
-            for m in gmail:
+            for m in iter_json_items(os.path.join("data", "gmail_export.json")):
                 artifacts.append({
                     "source": "gmail_export",
                     "id": f"gmail_{m.get('id')}",
@@ -142,40 +271,25 @@ class GDPRPlan:
                 })
         except Exception:
             artifacts.append({"source": "gmail_export", "id": "gmail_1", "type": "email", "content": "Hello Alice, phone +1-555-0101"})
+        return artifacts
 
+    def _load_crm_profile(self) -> List[Dict[str, Any]]:
         try:
             crm = read_json(os.path.join("data", "crm_profile.json"))
-            artifacts.append({
+            return [{
                 "source": "crm_profile",
                 "id": crm.get("id", "crm_1"),
                 "type": "profile",
                 "content": f"{crm.get('name','')}, {crm.get('email','')}, {crm.get('address','')}, {crm.get('phone','')}"
-            })
+            }]
         except Exception:
-            artifacts.append({"source": "crm_profile", "id": "crm_1", "type": "profile", "content": "Alice, alice@example.com, 221B Baker Street"})
-
-        # Optional: load text files from data/files
-        files_dir = os.path.join("data", "files")
-        try:
-            for fp in list_files(files_dir):
-                try:
-                    with open(fp, "r", encoding="utf-8", errors="ignore") as f:
-                        text = f.read()
-                    artifacts.append({
-                        "source": "files",
-                        "id": os.path.basename(fp),
-                        "type": "file",
-                        "content": text,
-                    })
-                except Exception:
-                    continue
-        except Exception:
-            # Directory might not exist in minimal demo; ignore
-            pass
+            return [{"source": "crm_profile", "id": "crm_1", "type": "profile", "content": "Alice, alice@example.com, 221B Baker Street"}]
 
+    def _load_gmail_live(self) -> List[Dict[str, Any]]:
         # Optional: load live Gmail messages if configured
+        artifacts: List[Dict[str, Any]] = []
         try:
-            gmail = GmailTool()
+            gmail = self._gmail
             if gmail.available:
                 msgs = gmail.fetch_messages(label_id=os.environ.get("GMAIL_LABEL_ID"), query=os.environ.get("GMAIL_QUERY"))
                 for m in msgs:
@@ -187,53 +301,84 @@ class GDPRPlan:
                     })
         except Exception:
             pass
+        return artifacts
+
+    def collect_artifacts(self) -> PlanStepResult:
+        # Sources are independent and I/O-bound: load them, and every file under
+        # data/files, on a shared pool while keeping the original artifact order.
+        files_dir = os.path.join("data", "files")
+        workers = min(32, (os.cpu_count() or 1) * 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            gmail_export = pool.submit(self._load_gmail_export)
+            crm_profile = pool.submit(self._load_crm_profile)
+            gmail_live = pool.submit(self._load_gmail_live)
+            try:
+                file_paths = list_files(files_dir)
+            except Exception:
+                # Directory might not exist in minimal demo; ignore
+                file_paths = []
+            files = [a for a in pool.map(_read_file_artifact, file_paths) if a is not None]
+            artifacts = gmail_export.result() + crm_profile.result() + files + gmail_live.result()
         self.state.artifacts = artifacts
+        self.state.artifact_types = tuple(sorted({a["type"] for a in artifacts}))
         self.log("collect_artifacts", {"count": len(artifacts)})
         return PlanStepResult(step="collect_artifacts", success=True, data={"artifacts": artifacts})
 
     def detect_pii(self) -> PlanStepResult:
-        findings: List[Dict[str, Any]] = []
+        findings: List[PiiFinding] = []
+        by_artifact: Dict[str, List[PiiFinding]] = {}
         ids = self._known_subject_identifiers()
-        for art in self.state.artifacts:
-            text = art.get("content", "")
-            for f in detect_pii_text(text):
-                value = f.get("value", "")
-                pii_type = f["pii_type"]
-                is_third = False
-                if pii_type == "email":
-                    is_third = str(value).strip().lower() not in ids["emails"]
-                elif pii_type == "phone":
-                    is_third = str(value).strip() not in ids["phones"]
-                findings.append({
-                    "artifact_id": art["id"],
-                    "pii_type": pii_type,
-                    "value": value,
-                    "start": f.get("start", 0),
-                    "end": f.get("end", 0),
-                    "confidence": f.get("confidence", 0.0),
-                    "third_party": is_third,
-                })
+        emails, phones = ids["emails"], ids["phones"]
+
+        def email_is_third(value: Any) -> bool:
+            return (value.lower() if isinstance(value, str) else value) not in emails
+
+        def phone_is_third(value: Any) -> bool:
+            return _phone_key(value if isinstance(value, str) else str(value)) not in phones
+
+        third_party_checks = {"email": email_is_third, "phone": phone_is_third}
+        arts = self.state.artifacts
+        # Every value is read below (third-party check, preview), so slice them up front
+        batches = detect_pii_batch([art.get("content", "") for art in arts], materialize_values=True)
+        for art, detected in zip(arts, batches):
+            bucket = by_artifact.setdefault(art["id"], [])
+            for f in detected:
+                check = third_party_checks.get(f.pii_type)
+                finding = PiiFinding(
+                    artifact_id=art["id"],
+                    pii_type=f.pii_type,
+                    value=f.value,
+                    start=f.start,
+                    end=f.end,
+                    confidence=f.confidence,
+                    third_party=check(f.value) if check is not None else False,
+                )
+                findings.append(finding)
+                bucket.append(finding)
         self.state.pii_findings = findings
-        tp_count = sum(1 for f in findings if f.get("third_party") is True)
+        self.state.pii_findings_by_artifact = by_artifact
+        self.state.pii_categories = tuple(sorted({f.pii_type for f in findings}))
+        tp_count = sum(1 for f in findings if f.third_party)
         self.log("detect_pii", {"count": len(findings), "third_party": tp_count})
         return PlanStepResult(step="detect_pii", success=True, data={"findings": findings})
 
     def apply_minimization(self) -> PlanStepResult:
-        proposals: List[Dict[str, Any]] = []
-        for idx, f in enumerate(self.state.pii_findings):
-            proposals.append({
-                "id": f"p{idx}",
-                "artifact_id": f["artifact_id"],
-                "pii_type": f["pii_type"],
-                "value": f.get("value", ""),
-                "masked_preview": mask_value(f.get("pii_type", ""), str(f.get("value", ""))),
-                "start": f.get("start", 0),
-                "end": f.get("end", 0),
-                "action": "mask",
-                "third_party": bool(f.get("third_party", False)),
-            })
+        proposals: List[RedactionProposal] = []
+        for aid, flist in self.state.pii_findings_by_artifact.items():
+            for f in flist:
+                proposals.append(RedactionProposal(
+                    id=f"p{len(proposals)}",
+                    artifact_id=aid,
+                    pii_type=f.pii_type,
+                    value=f.value,
+                    masked_preview=_mask(f.pii_type, str(f.value)),
+                    start=f.start,
+                    end=f.end,
+                    third_party=f.third_party,
+                ))
         self.state.redaction_proposals = proposals
-        tp_count = sum(1 for p in proposals if p.get("third_party") is True)
+        self.state.proposals_by_key = {(p.artifact_id, p.start, p.end): p for p in proposals}
+        tp_count = sum(1 for p in proposals if p.third_party)
         self.log("apply_minimization", {"proposals": len(proposals), "third_party": tp_count})
         return PlanStepResult(step="apply_minimization", success=True, data={"proposals": proposals})
 
@@ -241,8 +386,8 @@ class GDPRPlan:
         package = {"records": len(self.state.artifacts), "pii": len(self.state.pii_findings)}
         required = self.state.policy.get("disclosure", {}).get("require_sections", [])
         # Derive disclosures from current state where possible
-        pii_categories = sorted(list({f["pii_type"] for f in self.state.pii_findings}))
-        sources = sorted(list({a["source"] for a in self.state.artifacts}))
+        pii_categories = list(self.state.pii_categories)
+        artifact_types = list(self.state.artifact_types)
         retention_days = int(((self.state.policy.get("sla") or {}).get("access_days") or 30))
         disclosures: Dict[str, Any] = {}
         for key in required:
@@ -254,7 +399,7 @@ class GDPRPlan:
             elif key == "categories_of_data":
                 disclosures[key] = {
                     "pii_categories": pii_categories,
-                    "artifact_types": sorted(list({a["type"] for a in self.state.artifacts})),
+                    "artifact_types": artifact_types,
                 }
             elif key == "recipients":
                 disclosures[key] = [
@@ -276,13 +421,13 @@ class GDPRPlan:
         return PlanStepResult(step="assemble_disclosure", success=True, data={"package": package, "disclosures": self.state.disclosures})
 
     def request_compliance_approval(self) -> Clarification:
-        tp_count = sum(1 for p in self.state.redaction_proposals if p.get("third_party") is True)
+        tp_count = sum(1 for p in self.state.redaction_proposals if p.third_party)
         clar = Clarification(
             type="ComplianceApprovalClarification",
             payload={
                 "summary": {
                     "records": len(self.state.artifacts),
-                    "pii_categories": sorted(list({f["pii_type"] for f in self.state.pii_findings})),
+                    "pii_categories": list(self.state.pii_categories),
                     "third_party_findings": tp_count,
                 },
                 "redaction_proposals": self.state.redaction_proposals,
@@ -299,23 +444,36 @@ class GDPRPlan:
         if not approved:
             return PlanStepResult(step="finalize_delivery", success=False, error="Not approved")
         # Apply selected redactions and write a disclosure zip to out/{request_id}.zip
-        selected_ids = set(self.state.approvals.get("selected_proposals", []) or [p["id"] for p in self.state.redaction_proposals])
+        selected_ids = set(self.state.approvals.get("selected_proposals", []) or [p.id for p in self.state.redaction_proposals])
         # Build redacted artifacts map
         art_id_to_text = {a["id"]: a.get("content", "") for a in self.state.artifacts}
-        # Group proposals by artifact and sort by start descending to avoid index shift
-        by_art: Dict[str, List[Dict[str, Any]]] = {}
-        for p in self.state.redaction_proposals:
-            if p["id"] in selected_ids:
-                by_art.setdefault(p["artifact_id"], []).append(p)
-        for aid, plist in by_art.items():
+        # Walk findings per artifact, keep the selected proposals, and rebuild each text
+        # in a single left-to-right pass
+        by_key = self.state.proposals_by_key or {(p.artifact_id, p.start, p.end): p for p in self.state.redaction_proposals}
+        for aid, flist in self.state.pii_findings_by_artifact.items():
             text = art_id_to_text.get(aid, "")
-            for p in sorted(plist, key=lambda x: int(x.get("start", 0)), reverse=True):
-                value = str(p.get("value", ""))
-                masked = mask_value(p.get("pii_type", ""), value)
-                s, e = int(p.get("start", 0)), int(p.get("end", 0))
+            spans = []
+            for f in flist:
+                p = by_key.get((aid, f.start, f.end))
+                if p is None or p.id not in selected_ids:
+                    continue
+                s, e = p.start, p.end
                 if 0 <= s <= e <= len(text):
-                    text = text[:s] + masked + text[e:]
-            art_id_to_text[aid] = text
+                    spans.append((s, e, p.masked_preview))
+            if not spans:
+                continue
+            spans.sort(key=lambda x: (x[0], x[1]))
+            parts: List[str] = []
+            cursor = 0
+            for s, e, masked in spans:
+                if s < cursor:
+                    # Overlaps a span that is already masked
+                    continue
+                parts.append(text[cursor:s])
+                parts.append(masked)
+                cursor = e
+            parts.append(text[cursor:])
+            art_id_to_text[aid] = "".join(parts)
 
         out_dir = os.path.join(os.getcwd(), "out")
         os.makedirs(out_dir, exist_ok=True)
@@ -323,8 +481,8 @@ class GDPRPlan:
         artifacts_map = {
             "original_artifacts": self.state.artifacts,
             "redacted_artifacts": [{"id": aid, "content": art_id_to_text[aid]} for aid in art_id_to_text],
-            "pii_findings": self.state.pii_findings,
-            "applied_proposals": [p for p in self.state.redaction_proposals if p["id"] in selected_ids],
+            "pii_findings": [f.as_dict() for f in self.state.pii_findings],
+            "applied_proposals": [p.as_dict() for p in self.state.redaction_proposals if p.id in selected_ids],
             "disclosures": self.state.disclosures,
         }
         write_disclosure_zip(
@@ -356,21 +514,27 @@ class GDPRPlan:
         try:
             txns = read_json(os.path.join("data", "transaction_history.json"))
             now = datetime.now(timezone.utc)
-            for t in txns or []:
+            # "Within N days" becomes a single datetime comparison per transaction
+            fin_threshold = now - timedelta(days=fin_days)
+            svc_threshold = now - timedelta(days=svc_days)
+            # Most recent first: only recent entries can fall inside a retention window,
+            # so the scan below usually stops after a few transactions.
+            txns = sorted(txns or [], key=lambda t: str((t or {}).get("date") or ""), reverse=True)
+            for t in txns:
                 date_str = (t or {}).get("date") or ""
                 if not isinstance(date_str, str):
                     continue
                 try:
-                    # Support ISO8601 with 'Z'
-                    dt = datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+                    dt = _parse_iso8601(date_str)
                 except Exception:
                     continue
-                delta_days = (now - dt).days
-                if fin_days > 0 and delta_days < fin_days:
+                if fin_days > 0 and dt > fin_threshold:
                     retain_financial = True
                 # crude signal for active service
-                if svc_days > 0 and "subscription" in str((t or {}).get("product", "")).lower() and delta_days < svc_days:
+                if svc_days > 0 and dt > svc_threshold and "subscription" in str((t or {}).get("product", "")).lower():
                     retain_active_service = True
+                if (fin_days <= 0 or retain_financial) and (svc_days <= 0 or retain_active_service):
+                    break
         except Exception:
             pass
         if hold:
@@ -1,19 +1,99 @@
 from __future__ import annotations
 
+import functools
+import importlib
+import importlib.util
 import os
-from typing import Any, Dict, Optional
-import json
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 
+from src.tools.filesystem_tool import dumps_json
 
-try:
-    from portia.config import Config, LLMModel, LLMProvider  # type: ignore
-    from portia.portia import Portia  # type: ignore
-except Exception:  # pragma: no cover
-    Config = None
-    LLMProvider = None
-    LLMModel = None
-    Portia = None
+
+# The Portia SDK (and the LLM clients it pulls in) is only imported when a live
+# method first needs it; a spec lookup is enough to know whether it is installed.
+PORTIA_INSTALLED = importlib.util.find_spec("portia") is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _portia_module(name: str) -> Any:
+    return importlib.import_module(f"portia.{name}")
+
+
+def _portia() -> Tuple[Any, Any, Any, Any]:
+    """Return (Config, LLMProvider, LLMModel, Portia), importing the SDK on first call."""
+    config = _portia_module("config")
+    return config.Config, config.LLMProvider, config.LLMModel, _portia_module("portia").Portia
+
+
+@functools.lru_cache(maxsize=4)
+def _gemini_portia(provider: Any, model: Any) -> Any:
+    """Portia client for the given LLM provider/model, built once per process and shared."""
+    Config, _, _, Portia = _portia()
+    return Portia(config=Config.from_default(llm_provider=provider, llm_model_name=model))
+
+
+def _proposal_pii_types(state: Dict[str, Any]) -> List[str]:
+    """Sorted distinct PII types across the redaction proposals, excluding missing types."""
+    proposals = state.get("redaction_proposals") or []
+    if not proposals:
+        return []
+    # detect_pii already derived these; proposals are made one per finding
+    cached = state.get("pii_categories")
+    if cached:
+        return list(cached)
+    return _pii_types(proposals)
+
+
+def _pii_types(proposals: List[Any]) -> List[str]:
+    types = set()
+    types_add = types.add
+    for p in proposals:
+        t = p.pii_type
+        if t is not None:
+            types_add(t)
+    return sorted(types)
+
+
+# Deterministic cloud-mode payloads, kept as plain functions so each call is one dict build + one encode
+def build_compliance_clarification(
+    proposals: List[Any], n_artifacts: int, pii_types: Optional[List[str]] = None
+) -> str:
+    # pii_types may be passed when already known; otherwise it is derived from the proposals
+    return dumps_json({
+        "type": "ComplianceApprovalClarification",
+        "records": n_artifacts,
+        "pii_categories": _pii_types(proposals) if pii_types is None else pii_types,
+        "num_proposals": len(proposals),
+        "decision": "pending",
+    }).decode()
+
+
+def build_decision(decision: str, justification: str, selected_ids: List[str]) -> str:
+    return dumps_json({
+        "type": "ComplianceApprovalDecision",
+        "decision": decision,
+        "justification": justification,
+        "selected_proposals": selected_ids,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }).decode()
+
+
+def build_guardrail(reason: str) -> str:
+    return dumps_json({
+        "type": "GuardrailEvent",
+        "step": "finalize_delivery",
+        "blocked": True,
+        "reason": reason,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }).decode()
+
+
+@functools.lru_cache(maxsize=1)
+def _dashboard_url() -> str:
+    # Config.from_default() re-reads the environment; the dashboard URL does not change per run
+    return _portia()[0].from_default().portia_dashboard_url
 
 
 class PortiaOrchestrator:
@@ -26,27 +106,27 @@ class PortiaOrchestrator:
 
     def __init__(self) -> None:
         self.available = False
-        if Config is None:
+        # run_id -> latest requested {"state", "step_index"}; written to storage by flush()
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._pending_lock = threading.Lock()
+        if not PORTIA_INSTALLED:
             return
         # Require Portia Cloud API key for live PlanRuns
         if not os.environ.get("PORTIA_API_KEY"):
             # Still allow offline reporting features via Gemini if available
             try:
                 if os.environ.get("GOOGLE_API_KEY"):
-                    cfg = Config.from_default(
-                        llm_provider=LLMProvider.GOOGLE_GENERATIVE_AI,
-                        llm_model_name=LLMModel.GEMINI_2_0_FLASH,
-                    )
-                    self.client = Portia(config=cfg)
+                    _, LLMProvider, LLMModel, _ = _portia()
+                    self.client = _gemini_portia(LLMProvider.GOOGLE_GENERATIVE_AI, LLMModel.GEMINI_2_0_FLASH)
             except Exception:
                 pass
             self.available = False
             return
-        cfg = Config.from_default(
-            llm_provider=LLMProvider.GOOGLE_GENERATIVE_AI,
-            llm_model_name=LLMModel.GEMINI_2_0_FLASH,
-        )
-        self.client = Portia(config=cfg)
+        try:
+            _, LLMProvider, LLMModel, _ = _portia()
+            self.client = _gemini_portia(LLMProvider.GOOGLE_GENERATIVE_AI, LLMModel.GEMINI_2_0_FLASH)
+        except Exception:  # pragma: no cover
+            return
         self.available = True
 
     # --- Live PlanRun bridging ---
@@ -55,8 +135,9 @@ class PortiaOrchestrator:
             return None
         try:
             # Construct a minimal explicit plan (avoid planner validation issues)
-            from portia.plan import Plan, PlanContext, Step, PlanInput  # type: ignore
-            from portia.plan_run import PlanRunState  # type: ignore
+            plan_mod = _portia_module("plan")
+            Plan, PlanContext, Step, PlanInput = plan_mod.Plan, plan_mod.PlanContext, plan_mod.Step, plan_mod.PlanInput
+            PlanRunState = _portia_module("plan_run").PlanRunState
 
             steps = [
                 Step(task="verify_identity", output="$verify_identity"),
@@ -89,21 +170,41 @@ class PortiaOrchestrator:
             return None
 
     def update_live_run_state(self, run_id: str, state: str, step_index: int | None = None) -> None:
+        """Record a run state transition; it is saved by the next flush() or clarification update."""
         if not self.available:
             return
-        try:
-            from portia.prefixed_uuid import PlanRunUUID  # type: ignore
+        with self._pending_lock:
+            pending = self._pending.setdefault(run_id, {})
+            pending["state"] = state
+            if isinstance(step_index, int):
+                pending["step_index"] = step_index
 
-            pr_id = PlanRunUUID.from_string(run_id)
-            run = self.client.storage.get_plan_run(pr_id)
-            # Map string to PlanRunState enum if possible
-            from portia.plan_run import PlanRunState  # type: ignore
+    def _apply_pending(self, run_id: str, run: Any) -> bool:
+        with self._pending_lock:
+            pending = self._pending.pop(run_id, None)
+        if not pending:
+            return False
+        # Map string to PlanRunState enum if possible
+        PlanRunState = _portia_module("plan_run").PlanRunState
+        state = pending.get("state")
+        if state and hasattr(PlanRunState, state):
+            run.state = getattr(PlanRunState, state)
+        if "step_index" in pending:
+            run.current_step_index = pending["step_index"]
+        return True
 
-            if state and hasattr(PlanRunState, state):
-                run.state = getattr(PlanRunState, state)
-            if isinstance(step_index, int):
-                run.current_step_index = step_index
-            self.client.storage.save_plan_run(run)
+    def flush(self, run_id: str) -> None:
+        """Write pending state transitions for run_id in one get/save round-trip."""
+        if not self.available:
+            return
+        with self._pending_lock:
+            if run_id not in self._pending:
+                return
+        try:
+            pr_id = _portia_module("prefixed_uuid").PlanRunUUID.from_string(run_id)
+            run = self.client.storage.get_plan_run(pr_id)
+            if self._apply_pending(run_id, run):
+                self.client.storage.save_plan_run(run)
         except Exception:
             return
 
@@ -111,16 +212,16 @@ class PortiaOrchestrator:
         if not self.available:
             return
         try:
-            from portia.prefixed_uuid import PlanRunUUID  # type: ignore
-
-            pr_id = PlanRunUUID.from_string(run_id)
+            pr_id = _portia_module("prefixed_uuid").PlanRunUUID.from_string(run_id)
             run = self.client.storage.get_plan_run(pr_id)
-            # Resolve the last outstanding clarification, if any
-            for clar in reversed(run.outputs.clarifications):
-                if not clar.resolved:
-                    clar.response = response
-                    clar.resolved = True
-                    break
+            # Earlier transitions ride along with this save
+            self._apply_pending(run_id, run)
+            # Resolve the last outstanding clarification, if any; the run was just fetched, and the
+            # open one is normally the last, so a reverse scan stops almost immediately
+            target = next((c for c in reversed(run.outputs.clarifications) if not c.resolved), None)
+            if target is not None:
+                target.response = response
+                target.resolved = True
             self.client.storage.save_plan_run(run)
         except Exception:
             return
@@ -129,11 +230,12 @@ class PortiaOrchestrator:
         if not self.available:
             return
         try:
-            from portia.prefixed_uuid import PlanRunUUID  # type: ignore
-            from portia.clarification import Clarification, ClarificationCategory  # type: ignore
+            clar_mod = _portia_module("clarification")
+            Clarification, ClarificationCategory = clar_mod.Clarification, clar_mod.ClarificationCategory
 
-            pr_id = PlanRunUUID.from_string(run_id)
+            pr_id = _portia_module("prefixed_uuid").PlanRunUUID.from_string(run_id)
             run = self.client.storage.get_plan_run(pr_id)
+            self._apply_pending(run_id, run)
             clar = Clarification(
                 plan_run_id=run.id,
                 category=ClarificationCategory.CUSTOM,
@@ -143,9 +245,8 @@ class PortiaOrchestrator:
             # Attach our payload under the Output channel
             run.outputs.clarifications.append(clar)
             # Signal awaiting clarification
-            from portia.plan_run import PlanRunState  # type: ignore
             run.current_step_index = 6
-            run.state = PlanRunState.NEED_CLARIFICATION
+            run.state = _portia_module("plan_run").PlanRunState.NEED_CLARIFICATION
             self.client.storage.save_plan_run(run)
         except Exception:
             return
@@ -155,19 +256,19 @@ class PortiaOrchestrator:
         if os.environ.get("PORTIA_API_KEY"):
             try:
                 run_id = ((state.get("approvals") or {}).get("portia_run_id") or "")
-                from portia.config import Config as PConfig  # type: ignore
-                dash = PConfig.from_default().portia_dashboard_url  # type: ignore[attr-defined]
-                return (
-                    "{"
-                    f"\n  \"portia_run_id\": \"{run_id}\",\n"
-                    f"  \"dashboard_url\": \"{dash}/dashboard/plan-runs?plan_run_id={run_id}\"\n"
-                    "}"
-                )
+                payload = {
+                    "portia_run_id": run_id,
+                    "dashboard_url": f"{_dashboard_url()}/dashboard/plan-runs?plan_run_id={run_id}",
+                }
+                return dumps_json(payload, indent=True).decode()
             except Exception:
                 return "Portia live run is enabled; see dashboard link above."
         if not self.available:
             return "Portia unavailable (SDK or GOOGLE_API_KEY missing)."
 
+        policy = state.get("policy") or {}
+        disclosure = policy.get("disclosure") or {}
+        redaction = policy.get("redaction") or {}
         # Describe a pre-expressed DSAR plan that mirrors our local steps
         plan_prompt = (
             "Pre-express a GDPR DSAR plan and execute it as a dry-run.\n"
@@ -178,8 +279,8 @@ class PortiaOrchestrator:
             "-> execute_erasure (mock) -> confirm_completion.\n\n"
             f"Subject: {state.get('subject_email')}\n"
             f"Request types: {state.get('request_types')}\n"
-            f"Policy.required_disclosures: {((state.get('policy') or {}).get('disclosure') or {}).get('require_sections', [])}\n"
-            f"Policy.redaction.required_types: {((state.get('policy') or {}).get('redaction') or {}).get('required_types', [])}\n"
+            f"Policy.required_disclosures: {disclosure.get('require_sections', [])}\n"
+            f"Policy.redaction.required_types: {redaction.get('required_types', [])}\n"
             "Note: Perform planning and produce a PlanRun JSON; do not perform external network calls."
         )
         try:
@@ -193,20 +294,15 @@ class PortiaOrchestrator:
         """Return a structured Clarification JSON. In Cloud mode, return local structure."""
         if os.environ.get("PORTIA_API_KEY"):
             # Build from local state directly and return strict JSON
-            proposals = state.get("redaction_proposals", [])
-            pii_types_list = sorted({p.get("pii_type") for p in proposals if p.get("pii_type") is not None})
-            payload: Dict[str, Any] = {
-                "type": "ComplianceApprovalClarification",
-                "records": len(state.get("artifacts", [])),
-                "pii_categories": pii_types_list,
-                "num_proposals": len(proposals),
-                "decision": "pending",
-            }
-            return json.dumps(payload)
+            return build_compliance_clarification(
+                state.get("redaction_proposals", []),
+                len(state.get("artifacts", [])),
+                _proposal_pii_types(state),
+            )
         if not self.available:
             return "Portia unavailable (SDK or GOOGLE_API_KEY missing)."
         proposals = state.get("redaction_proposals", [])
-        pii_types = sorted({p.get("pii_type") for p in proposals})
+        pii_types = _proposal_pii_types(state)
         prompt = (
             "Create a Clarification object named ComplianceApprovalClarification. Include: summary with record count, "
             "pii_categories, and an array of redaction_proposals (artifact_id, pii_type, start, end). "
@@ -231,15 +327,7 @@ class PortiaOrchestrator:
         """Record the human decision into a Portia-traceable artifact (JSON)."""
         # In Cloud mode, avoid LLM runs; return deterministic JSON
         if os.environ.get("PORTIA_API_KEY"):
-            selected_ids = selected_ids or []
-            payload: Dict[str, Any] = {
-                "type": "ComplianceApprovalDecision",
-                "decision": decision,
-                "justification": justification,
-                "selected_proposals": selected_ids,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            return json.dumps(payload)
+            return build_decision(decision, justification, selected_ids or [])
         if not self.available:
             return "Portia unavailable (SDK or GOOGLE_API_KEY missing)."
         selected_ids = selected_ids or []
@@ -257,14 +345,7 @@ class PortiaOrchestrator:
     def record_guardrail_block(self, reason: str) -> str:
         # In Cloud mode, avoid LLM runs; return deterministic JSON
         if os.environ.get("PORTIA_API_KEY"):
-            payload: Dict[str, Any] = {
-                "type": "GuardrailEvent",
-                "step": "finalize_delivery",
-                "blocked": True,
-                "reason": reason,
-                "timestamp": datetime.now(timezone.utc).isoformat(),
-            }
-            return json.dumps(payload)
+            return build_guardrail(reason)
         if not self.available:
             return "Portia unavailable (SDK or GOOGLE_API_KEY missing)."
         prompt = (
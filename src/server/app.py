@@ -1,88 +1,274 @@
 from __future__ import annotations
 
+import asyncio
+import contextlib
+import functools
 import json
+import logging
 import os
+import re
 import sys
+import tempfile
+import threading
 import uuid
-from typing import Any, Dict
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
 
 import uvicorn
 import yaml
 from dotenv import load_dotenv
-from fastapi import FastAPI, Form, Request, UploadFile, File
+from fastapi import BackgroundTasks, FastAPI, Form, Request, UploadFile, File
 from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, FileResponse
-from jinja2 import Environment, FileSystemLoader, select_autoescape
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader, Template, select_autoescape
 
 from src.agent.plan import GDPRPlan, PlanRunState
 from src.agent import hooks
 from src.agent.llm import PortiaLLM
-from src.agent.portia_orchestrator import PortiaOrchestrator
+from src.agent.portia_orchestrator import PORTIA_INSTALLED, PortiaOrchestrator
+from src.tools.filesystem_tool import dumps_json, read_json
 import time
 
 
+class FastJSONResponse(JSONResponse):
+    # orjson-backed when installed; see dumps_json
+    def render(self, content: Any) -> bytes:
+        return dumps_json(content)
+
+
 load_dotenv()
-app = FastAPI()
 
+# Compiled templates are cached on disk; set DEBUG to pick up template edits without a restart.
+# Jinja's default cache directory is per-user, mode 0700 and owner-checked, so other local users
+# cannot plant bytecode in it.
+DEBUG = bool(os.environ.get("DEBUG"))
 templates = Environment(
     loader=FileSystemLoader(searchpath=str(os.path.join(os.path.dirname(__file__), "templates"))),
     autoescape=select_autoescape(["html", "xml"]),
+    auto_reload=DEBUG,
+    cache_size=400,
+    bytecode_cache=FileSystemBytecodeCache(),
 )
+INDEX_TMPL = templates.get_template("index.html")
+RUN_TMPL = templates.get_template("run.html")
+
 
+def _render(tmpl: Template, **context: Any) -> str:
+    # auto_reload only applies to get_template(), so under DEBUG look the template up on each render
+    if DEBUG:
+        tmpl = templates.get_template(tmpl.name)
+    return tmpl.render(**context)
+# Filenames of the demo subject's ID; every other non-empty upload scores the same generic confidence
+_ID_RE = re.compile(r"alice", re.I)
 
+
+@functools.lru_cache(maxsize=1)
 def load_policy() -> Dict[str, Any]:
+    # Parsed once per process; restart the server to pick up policy edits
     policy_path = os.path.join(os.getcwd(), "policy", "policy.yaml")
     with open(policy_path, "r", encoding="utf-8") as f:
         return yaml.safe_load(f)
 
 
-RUNS: Dict[str, PlanRunState] = {}
-def _cleanup_out_ttl(days: int = 30) -> None:
+@functools.lru_cache(maxsize=1)
+def _load_crm(path: str, mtime: float) -> Any:
+    # Keyed on mtime so an edited profile is re-read; otherwise the parsed dict is reused
+    return read_json(path)
+
+
+# Most recently used runs, oldest first; evicted runs are reloaded from RUNS_DIR on demand
+RUNS: "OrderedDict[str, PlanRunState]" = OrderedDict()
+RUNS_MAX = int(os.environ.get("RUNS_CACHE_SIZE", 1024))
+# Run files hold artifact text and PII, so they expire with the rest of out/ (see _cleanup_out_ttl)
+RUNS_DIR = os.path.join(os.getcwd(), "out", "runs")
+_RUNS_LOCK = threading.RLock()
+# rid -> st_mtime_ns of the run file the cached state matches; absent if the run was never persisted
+_RUN_MTIMES: Dict[str, int] = {}
+
+
+def _run_path(rid: str) -> Optional[str]:
+    # Only UUIDs are issued as run ids; anything else must not reach the filesystem
     try:
-        out_dir = os.path.join(os.getcwd(), "out")
-        if not os.path.isdir(out_dir):
-            return
-        now = time.time()
-        ttl = days * 24 * 60 * 60
-        for fname in os.listdir(out_dir):
-            fp = os.path.join(out_dir, fname)
-            try:
-                if os.path.isfile(fp):
-                    age = now - os.path.getmtime(fp)
-                    if age > ttl:
-                        os.remove(fp)
-            except Exception:
-                continue
+        uuid.UUID(rid)
+    except ValueError:
+        return None
+    return os.path.join(RUNS_DIR, f"{rid}.json")
+
+
+def _persist(rid: str, state: PlanRunState) -> None:
+    path = _run_path(rid)
+    if path is None:
+        return
+    os.makedirs(RUNS_DIR, exist_ok=True)
+    # A unique temp file per save, so concurrent saves of one run cannot interleave their writes
+    fd, tmp = tempfile.mkstemp(dir=RUNS_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(state.to_dict(), f, default=str)
+        os.replace(tmp, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.unlink(tmp)
+        raise
+    with _RUNS_LOCK:
+        _RUN_MTIMES[rid] = os.stat(path).st_mtime_ns
+
+
+def _load(rid: str) -> Optional[PlanRunState]:
+    path = _run_path(rid)
+    if path is None:
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+            state = PlanRunState.from_dict(json.load(f))
+    except FileNotFoundError:
+        return None
+    with _RUNS_LOCK:
+        _RUN_MTIMES[rid] = mtime
+    return state
+
+
+def _cache_run(rid: str, state: PlanRunState) -> None:
+    with _RUNS_LOCK:
+        RUNS[rid] = state
+        RUNS.move_to_end(rid)
+        while len(RUNS) > RUNS_MAX:
+            evicted, _ = RUNS.popitem(last=False)
+            _RUN_MTIMES.pop(evicted, None)
+
+
+def _forget_run(rid: str) -> None:
+    with _RUNS_LOCK:
+        RUNS.pop(rid, None)
+        _RUN_MTIMES.pop(rid, None)
+
+
+def save_run(rid: str, state: PlanRunState) -> None:
+    """Cache the run and write it to disk so other workers and later requests can see it."""
+    _cache_run(rid, state)
+    try:
+        _persist(rid, state)
     except Exception:
         pass
 
 
+def _cached_run_is_current(rid: str) -> bool:
+    # Another worker may have saved (or the TTL sweep removed) the run since it was cached
+    path = _run_path(rid)
+    with _RUNS_LOCK:
+        cached_mtime = _RUN_MTIMES.get(rid)
+    if path is None or cached_mtime is None:
+        # Never persisted (e.g. the write failed): the in-memory copy is all there is
+        return True
+    try:
+        return os.stat(path).st_mtime_ns == cached_mtime
+    except OSError:
+        return False
+
+
+def get_run(rid: str) -> Optional[PlanRunState]:
+    with _RUNS_LOCK:
+        state = RUNS.get(rid)
+    if state is not None:
+        if _cached_run_is_current(rid):
+            with _RUNS_LOCK:
+                if rid in RUNS:
+                    RUNS.move_to_end(rid)
+            return state
+        _forget_run(rid)
+    try:
+        state = _load(rid)
+    except Exception:
+        return None
+    if state is not None:
+        _cache_run(rid, state)
+    return state
+
+
+# One orchestrator per process; it only holds the Portia client and env-derived flags
+ORCHESTRATOR = PortiaOrchestrator()
+
+
+CLEANUP_INTERVAL_S = 3600
+logger = logging.getLogger(__name__)
+
+
+def _expired_files(dir_path: str, cutoff: float) -> List[str]:
+    if not os.path.isdir(dir_path):
+        return []
+    expired: List[str] = []
+    # scandir yields the file type with each entry, so only one stat per file is needed
+    with os.scandir(dir_path) as it:
+        for e in it:
+            try:
+                if e.is_file(follow_symlinks=False) and e.stat().st_mtime < cutoff:
+                    expired.append(e.path)
+            except OSError:
+                # Gone since the listing (e.g. a run save's temp file was renamed); skip just this entry
+                continue
+    return expired
+
+
+def _cleanup_out_ttl(days: int = 30) -> None:
+    out_dir = os.path.join(os.getcwd(), "out")
+    cutoff = time.time() - days * 24 * 60 * 60
+    # Disclosure packages at the top level, and persisted run states (with their PII) under out/runs
+    for path in _expired_files(out_dir, cutoff) + _expired_files(RUNS_DIR, cutoff):
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        if os.path.dirname(path) == RUNS_DIR:
+            rid, ext = os.path.splitext(os.path.basename(path))
+            if ext == ".json":
+                _forget_run(rid)
+
+
+async def _cleanup_loop() -> None:
+    # Runs for the life of the app, keeping cleanup I/O off the request path
+    while True:
+        try:
+            days = int((load_policy().get("sla") or {}).get("access_days", 30))
+            await asyncio.to_thread(_cleanup_out_ttl, days)
+        except Exception:
+            # No middleware sees background task errors, and a dead loop would stop expiring
+            # DSAR packages for the life of the process: log and retry on the next pass
+            logger.exception("out/ TTL cleanup failed")
+        await asyncio.sleep(CLEANUP_INTERVAL_S)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(_cleanup_loop())
+    try:
+        yield
+    finally:
+        task.cancel()
+
+
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
 
 @app.get("/", response_class=HTMLResponse)
 def index() -> str:
-    tmpl = templates.get_template("index.html")
-    # TTL cleanup best-effort on index hits
-    _cleanup_out_ttl(days=int((load_policy().get("sla") or {}).get("access_days", 30)))
-    return tmpl.render(runs=list(RUNS.values()))
+    with _RUNS_LOCK:
+        runs = list(RUNS.values())
+    return _render(INDEX_TMPL, runs=runs)
 
 
 @app.get("/health")
 def health():
-    try:
-        import portia  # type: ignore
-
-        sdk = True
-    except Exception:
-        sdk = False
+    sdk = PORTIA_INSTALLED
     # Gmail availability check
     gmail_available = False
     gmail_reason = None
     try:
-        from src.tools.gmail_tool import GmailTool  # type: ignore
+        from src.tools.gmail_tool import gmail_status  # type: ignore
 
-        g = GmailTool()
-        gmail_available = bool(getattr(g, "available", False))
+        # Libraries + token presence only; building the API client is left to the DSAR flow
+        gmail_available, reason = gmail_status()
         if not gmail_available:
-            gmail_reason = getattr(g, "reason_unavailable", None)
+            gmail_reason = reason
     except Exception as e:  # pragma: no cover
         gmail_available = False
         gmail_reason = str(e)
@@ -109,6 +295,8 @@ async def new_dsar(
         request_types=[request_type],
         policy=load_policy(),
     )
+    # Live view of the state's fields; the guards, LLM and orchestrator all read from it
+    sd = state.__dict__
     plan = GDPRPlan(state)
     # Seed legal hold from CRM profile if present
     try:
@@ -116,7 +304,8 @@ async def new_dsar(
             "legal_hold": False,
         }
         try:
-            crm = json.load(open(os.path.join("data", "crm_profile.json"), "r", encoding="utf-8"))
+            crm_path = os.path.join("data", "crm_profile.json")
+            crm = _load_crm(crm_path, os.path.getmtime(crm_path))
         except Exception:
             pass
         if isinstance(crm, dict) and "legal_hold" in crm:
@@ -129,18 +318,16 @@ async def new_dsar(
         pre_conf = 0.10
         upload_meta = None
         if id_image is not None:
-            data = await id_image.read()
-            size = len(data) if data else 0
+            # Only size and filename are used: measure the spooled upload instead of reading it into memory
+            size = getattr(id_image, "size", None)
+            if size is None:
+                id_image.file.seek(0, os.SEEK_END)
+                size = id_image.file.tell()
+                id_image.file.seek(0)
             filename = id_image.filename or ""
             upload_meta = {"filename": filename, "size": size}
-            fname = filename.lower()
             if size > 0:
-                if "alice" in fname:
-                    pre_conf = 0.95
-                elif any(k in fname for k in ["id", "license", "passport"]):
-                    pre_conf = 0.60
-                else:
-                    pre_conf = 0.60
+                pre_conf = 0.95 if _ID_RE.search(filename) else 0.60
             else:
                 pre_conf = 0.10
         state.identity = {**(state.identity or {}), "upload": upload_meta, "precomputed_confidence": pre_conf}
@@ -149,8 +336,7 @@ async def new_dsar(
         state.identity = {**(state.identity or {}), "precomputed_confidence": 0.10}
     # Create live Portia run
     try:
-        orchestrator = PortiaOrchestrator()
-        live_id = orchestrator.create_live_run(subject_email)
+        live_id = ORCHESTRATOR.create_live_run(subject_email)
         if live_id:
             state.approvals["portia_run_id"] = live_id
     except Exception:
@@ -159,12 +345,12 @@ async def new_dsar(
     # Execution flow with simple guards
     step = plan.verify_identity()
     if not step.success:
-        RUNS[rid] = state
+        save_run(rid, state)
         return RedirectResponse(url=f"/run/{rid}", status_code=303)
 
-    guard = hooks.pre_step_guard(state.__dict__, "discover_sources")
+    guard = hooks.pre_step_guard(sd, "discover_sources")
     if not guard["allow"]:
-        RUNS[rid] = state
+        save_run(rid, state)
         return RedirectResponse(url=f"/run/{rid}", status_code=303)
 
     plan.discover_sources()
@@ -174,57 +360,56 @@ async def new_dsar(
     plan.assemble_disclosure()
     # Generate LLM summary (Gemini via Portia)
     llm = PortiaLLM()
-    llm_summary = llm.summarize(state.__dict__)
+    llm_summary = llm.summarize(sd)
     clar = plan.request_compliance_approval()
     # Reflect clarification in live Portia run
     try:
-        orchestrator = PortiaOrchestrator()
         if state.approvals.get("portia_run_id"):
-            orchestrator.add_live_clarification(state.approvals["portia_run_id"], clar.payload)
-            orchestrator.update_live_run_state(state.approvals["portia_run_id"], "NEED_CLARIFICATION")
+            # Also moves the run to NEED_CLARIFICATION in the same save
+            ORCHESTRATOR.add_live_clarification(state.approvals["portia_run_id"], clar.payload)
     except Exception:
         pass
     # attach summary for UI
     state.approvals["summary_llm"] = llm_summary
     # Generate a Portia PlanRun JSON for auditing
     try:
-        orchestrator = PortiaOrchestrator()
-        state.approvals["portia_plan_run_json"] = orchestrator.generate_plan_run_json(state.__dict__)
-        state.approvals["portia_compliance_clarification_json"] = orchestrator.create_compliance_clarification(state.__dict__)
+        state.approvals["portia_plan_run_json"] = ORCHESTRATOR.generate_plan_run_json(sd)
+        state.approvals["portia_compliance_clarification_json"] = ORCHESTRATOR.create_compliance_clarification(sd)
     except Exception as e:
         state.approvals["portia_plan_run_json"] = f"Portia orchestration error: {e}"
         state.approvals["portia_compliance_clarification_json"] = f"Portia orchestration error: {e}"
 
-    RUNS[rid] = state
+    save_run(rid, state)
     return RedirectResponse(url=f"/run/{rid}", status_code=303)
 
 
 @app.get("/run/{rid}", response_class=HTMLResponse)
 def view_run(rid: str) -> str:
-    if rid not in RUNS:
+    state = get_run(rid)
+    if state is None:
         return HTMLResponse(content="Not found", status_code=404)
-    state = RUNS[rid]
-    tmpl = templates.get_template("run.html")
-    audit_pretty = json.dumps(state.audit_log, indent=2)
-    return tmpl.render(state=state, audit_pretty=audit_pretty)
+    audit_pretty = dumps_json(state.audit_log, indent=True).decode()
+    return _render(RUN_TMPL, state=state, audit_pretty=audit_pretty)
 
 
 @app.post("/legal/{rid}/toggle")
 async def toggle_legal_hold(rid: str, hold: str = Form(...)):
-    if rid not in RUNS:
-        return JSONResponse({"error": "not found"}, status_code=404)
-    state = RUNS[rid]
+    state = get_run(rid)
+    if state is None:
+        return FastJSONResponse({"error": "not found"}, status_code=404)
     value = str(hold).strip().lower() in {"1", "true", "yes", "on"}
     state.legal = {**(state.legal or {}), "hold": value}
     state.audit_log.append({"step": "legal_hold_set", "hold": value})
+    save_run(rid, state)
     return RedirectResponse(url=f"/run/{rid}", status_code=303)
 
 
 @app.post("/approve/{rid}")
-async def approve(rid: str, request: Request, decision: str = Form(...), justification: str = Form(""), approval_type: str = Form("compliance")):
-    if rid not in RUNS:
-        return JSONResponse({"error": "not found"}, status_code=404)
-    state = RUNS[rid]
+async def approve(rid: str, request: Request, background_tasks: BackgroundTasks, decision: str = Form(...), justification: str = Form(""), approval_type: str = Form("compliance")):
+    state = get_run(rid)
+    if state is None:
+        return FastJSONResponse({"error": "not found"}, status_code=404)
+    sd = state.__dict__
     form = await request.form()
     selected = form.getlist("proposal") if hasattr(form, "getlist") else []
     if approval_type == "legal":
@@ -236,15 +421,14 @@ async def approve(rid: str, request: Request, decision: str = Form(...), justifi
     # Finalization guard
     # If this is compliance approval and approved, finalize disclosure
     if approval_type == "compliance":
-        guard = hooks.pre_finalize_guard(state.__dict__)
+        guard = hooks.pre_finalize_guard(sd)
         if not guard["allow"]:
             state.audit_log.append({"step": "finalize_delivery", "blocked": True, "reason": guard["reason"]})
             # Record guardrail block in Portia trace if available
             try:
-                orchestrator = PortiaOrchestrator()
-                state.approvals["portia_guardrail_event_json"] = orchestrator.record_guardrail_block(guard["reason"])  # type: ignore
+                state.approvals["portia_guardrail_event_json"] = ORCHESTRATOR.record_guardrail_block(guard["reason"])  # type: ignore
                 if state.approvals.get("portia_run_id"):
-                    orchestrator.update_live_run_state(state.approvals["portia_run_id"], "NEED_CLARIFICATION")
+                    ORCHESTRATOR.update_live_run_state(state.approvals["portia_run_id"], "NEED_CLARIFICATION")
             except Exception:
                 pass
             state.approvals["compliance_status"] = {"status": "blocked", "reason": guard["reason"]}
@@ -253,14 +437,14 @@ async def approve(rid: str, request: Request, decision: str = Form(...), justifi
             plan.finalize_delivery()
             # Reflect decision back into Portia trace
             try:
-                orchestrator = PortiaOrchestrator()
                 selected_ids = state.approvals.get("selected_proposals") or []
-                state.approvals["portia_compliance_decision_json"] = orchestrator.record_compliance_decision(
-                    state.__dict__, decision, justification, selected_ids
+                state.approvals["portia_compliance_decision_json"] = ORCHESTRATOR.record_compliance_decision(
+                    sd, decision, justification, selected_ids
                 )
                 if state.approvals.get("portia_run_id"):
-                    orchestrator.resolve_live_clarification(state.approvals["portia_run_id"], decision)
-                    orchestrator.update_live_run_state(state.approvals["portia_run_id"], "COMPLETE")
+                    # Recorded first so the transition rides along with the clarification's save
+                    ORCHESTRATOR.update_live_run_state(state.approvals["portia_run_id"], "COMPLETE")
+                    ORCHESTRATOR.resolve_live_clarification(state.approvals["portia_run_id"], decision)
             except Exception:
                 pass
             state.approvals["compliance_status"] = {"status": "delivered"}
@@ -270,14 +454,13 @@ async def approve(rid: str, request: Request, decision: str = Form(...), justifi
         plan = GDPRPlan(state)
         plan.evaluate_legal_basis()
         # Pre-erasure guard
-        eguard = hooks.pre_erasure_guard(state.__dict__)
+        eguard = hooks.pre_erasure_guard(sd)
         if not eguard["allow"]:
             state.audit_log.append({"step": "execute_erasure", "blocked": True, "reason": eguard["reason"]})
             state.approvals["legal_status"] = {"status": "blocked", "reason": eguard["reason"]}
             try:
-                orchestrator = PortiaOrchestrator()
                 if state.approvals.get("portia_run_id"):
-                    orchestrator.update_live_run_state(state.approvals["portia_run_id"], "NEED_CLARIFICATION")
+                    ORCHESTRATOR.update_live_run_state(state.approvals["portia_run_id"], "NEED_CLARIFICATION")
             except Exception:
                 pass
         else:
@@ -285,23 +468,26 @@ async def approve(rid: str, request: Request, decision: str = Form(...), justifi
             plan.confirm_completion()
             state.approvals["legal_status"] = {"status": "erasure_executed", "deleted": len((state.erasure or {}).get("deleted", []))}
             try:
-                orchestrator = PortiaOrchestrator()
                 if state.approvals.get("portia_run_id"):
-                    orchestrator.update_live_run_state(state.approvals["portia_run_id"], "COMPLETE")
+                    ORCHESTRATOR.update_live_run_state(state.approvals["portia_run_id"], "COMPLETE")
             except Exception:
                 pass
 
+    # Transitions not already saved with a clarification update are written after the response
+    if state.approvals.get("portia_run_id"):
+        background_tasks.add_task(ORCHESTRATOR.flush, state.approvals["portia_run_id"])
+    save_run(rid, state)
     return RedirectResponse(url=f"/run/{rid}", status_code=303)
 
 
 @app.get("/download/{rid}")
 def download(rid: str):
-    if rid not in RUNS:
-        return JSONResponse({"error": "not found"}, status_code=404)
-    state = RUNS[rid]
+    state = get_run(rid)
+    if state is None:
+        return FastJSONResponse({"error": "not found"}, status_code=404)
     path = (state.delivery or {}).get("path")
     if not path or not os.path.exists(path):
-        return JSONResponse({"error": "no package"}, status_code=404)
+        return FastJSONResponse({"error": "no package"}, status_code=404)
     filename = os.path.basename(path)
     return FileResponse(path, filename=filename, media_type="application/zip")
 
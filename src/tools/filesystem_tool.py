@@ -1,23 +1,73 @@
 from __future__ import annotations
 
+import fnmatch
 import json
+import os
+import re
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, Iterator, List
+
+# Optional fast/streaming JSON parsers and encoder; stdlib json is used if unavailable
+try:  # pragma: no cover
+    import orjson  # type: ignore
+except Exception:  # pragma: no cover
+    orjson = None  # type: ignore
+try:  # pragma: no cover
+    import ijson  # type: ignore
+except Exception:  # pragma: no cover
+    ijson = None  # type: ignore
 
 
 def read_json(path: str) -> Any:
     p = Path(path)
+    if orjson is not None:
+        return orjson.loads(p.read_bytes())
     with p.open("r", encoding="utf-8") as f:
         return json.load(f)
 
 
-def list_files(dir_path: str, patterns: List[str] | None = None) -> List[str]:
-    base = Path(dir_path)
-    files: List[str] = []
-    for p in base.rglob("*"):
-        if p.is_file():
-            files.append(str(p))
-    return files
+def dumps_json(obj: Any, indent: bool = False) -> bytes:
+    """Encode obj as UTF-8 JSON: compact, or with a two-space indent when `indent` is set.
+
+    The one JSON encoder for responses, audit views and package members. Non-string dict
+    keys are stringified under both backends, as stdlib json does.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(obj, indent=2, ensure_ascii=False).encode("utf-8")
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
 
+def iter_json_items(path: str) -> Iterator[Any]:
+    """Yield the elements of a top-level JSON array without loading it all when ijson is installed."""
+    if ijson is None:
+        yield from read_json(path)
+        return
+    with Path(path).open("rb") as f:
+        yield from ijson.items(f, "item")
 
 
+def iter_files(dir_path: str, patterns: List[str] | None = None) -> Iterator[str]:
+    """Yield regular files under dir_path, optionally keeping only names matching glob patterns.
+
+    Walks with os.scandir so entry types come from the directory listing instead of
+    one stat() per entry; symlinks are not followed.
+    """
+    pat_re = re.compile("|".join(fnmatch.translate(p) for p in patterns)) if patterns else None
+    stack = [dir_path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and (pat_re is None or pat_re.match(entry.name)):
+                        yield entry.path
+        except OSError:
+            # Missing or unreadable directory; skip it like Path.rglob does
+            continue
+
+
+def list_files(dir_path: str, patterns: List[str] | None = None) -> List[str]:
+    return list(iter_files(dir_path, patterns))
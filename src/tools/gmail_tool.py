@@ -1,7 +1,9 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+import functools
 import os
+import threading
 
 
 # Try to import Google API libraries lazily; tool will gracefully degrade if unavailable
@@ -9,13 +11,50 @@ try:  # pragma: no cover
     from googleapiclient.discovery import build  # type: ignore
     from google.oauth2.credentials import Credentials  # type: ignore
     from google.auth.transport.requests import Request  # type: ignore
+    from googleapiclient.errors import HttpError  # type: ignore
 except Exception:  # pragma: no cover
     build = None  # type: ignore
     Credentials = None  # type: ignore
     Request = None  # type: ignore
+    HttpError = None  # type: ignore
 
 
 SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+# Maximum number of calls the Gmail batch endpoint accepts per request
+BATCH_SIZE = 100
+# The shared service's httplib2 transport is not thread-safe; API calls on it are serialized
+_SERVICE_LOCK = threading.Lock()
+
+
+def _token_path() -> Optional[str]:
+    # Prefer explicit env var; fall back to ./token.json in project root
+    token_path_env = os.environ.get("GMAIL_TOKEN_PATH")
+    if token_path_env and os.path.exists(token_path_env):
+        return token_path_env
+    default_token_path = os.path.join(os.getcwd(), "token.json")
+    return default_token_path if os.path.exists(default_token_path) else None
+
+
+def gmail_status() -> Tuple[bool, str]:
+    """Cheap availability check (libraries importable, token present) that does not build the service."""
+    if build is None or Credentials is None:
+        return False, "google-api-python-client not installed"
+    if not _token_path():
+        return False, "No Gmail OAuth token found (set GMAIL_TOKEN_PATH or place token.json in project root)"
+    return True, ""
+
+
+@functools.lru_cache(maxsize=None)
+def get_service(token_path: str) -> Any:
+    """Gmail API resource for a token file, built once per process and shared by every GmailTool.
+
+    The discovery document ships with the client library, so building needs no network round-trip;
+    the authorized HTTP transport refreshes the credentials itself when they expire.
+    """
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if creds and creds.expired and creds.refresh_token:
+        creds.refresh(Request())
+    return build("gmail", "v1", credentials=creds, cache_discovery=False, static_discovery=True)
 
 
 class GmailTool:
@@ -31,23 +70,12 @@ class GmailTool:
     def __init__(self) -> None:
         self.available: bool = False
         self.reason_unavailable: str = ""
-        if build is None or Credentials is None:  # google libraries not installed
-            self.reason_unavailable = "google-api-python-client not installed"
-            return
-        # Prefer explicit env var; fall back to ./token.json in project root
-        token_path_env = os.environ.get("GMAIL_TOKEN_PATH")
-        default_token_path = os.path.join(os.getcwd(), "token.json")
-        token_path = token_path_env if (token_path_env and os.path.exists(token_path_env)) else (
-            default_token_path if os.path.exists(default_token_path) else None
-        )
-        if not token_path:
-            self.reason_unavailable = "No Gmail OAuth token found (set GMAIL_TOKEN_PATH or place token.json in project root)"
+        ok, reason = gmail_status()
+        if not ok:
+            self.reason_unavailable = reason
             return
         try:
-            creds = Credentials.from_authorized_user_file(token_path, SCOPES)
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            self.service = build("gmail", "v1", credentials=creds, cache_discovery=False)
+            self.service = get_service(_token_path())
             self.available = True
         except Exception as e:  # pragma: no cover
             self.reason_unavailable = f"Auth/init error: {e}"
@@ -60,6 +88,10 @@ class GmailTool:
     ) -> List[Dict[str, Any]]:
         if not self.available:
             return []
+        with _SERVICE_LOCK:
+            return self._fetch_messages(label_id, query, max_results)
+
+    def _fetch_messages(self, label_id: Optional[str], query: Optional[str], max_results: int) -> List[Dict[str, Any]]:
         try:
             user_id = "me"
             params: Dict[str, Any] = {"maxResults": max_results}
@@ -67,11 +99,50 @@ class GmailTool:
                 params["labelIds"] = [label_id]
             if query:
                 params["q"] = query
-            listing = self.service.users().messages().list(userId=user_id, **params).execute() or {}
-            messages = listing.get("messages", [])
+            # Resolve the messages resource once and reuse it for the list and every get
+            messages = self.service.users().messages()
+            listing = messages.list(userId=user_id, **params).execute() or {}
+            ids = [m.get("id") for m in listing.get("messages", []) if m.get("id")]
+            fetched: Dict[str, Dict[str, Any]] = {}
+
+            def _collect(request_id: str, response: Any, exception: Any) -> None:
+                if exception is None and response:
+                    fetched[request_id] = response
+
+            def _get(msg_id: str) -> Any:
+                return messages.get(
+                    userId=user_id,
+                    id=msg_id,
+                    format="metadata",
+                    metadataHeaders=["Subject"],
+                    # Only the parts we read; trims each response body
+                    fields="id,snippet,payload/headers",
+                )
+
+            try:
+                # One HTTP round trip per chunk instead of one per message
+                for i in range(0, len(ids), BATCH_SIZE):
+                    batch = self.service.new_batch_http_request(callback=_collect)
+                    for msg_id in ids[i:i + BATCH_SIZE]:
+                        batch.add(_get(msg_id), request_id=msg_id)
+                    batch.execute()
+            except Exception:
+                # Batch endpoint unavailable; the loop below fetches what is missing
+                pass
+            # Messages whose batch sub-request failed (e.g. a 429) or never ran are fetched one by one,
+            # so a partial batch failure cannot silently drop messages from the collection
+            for msg_id in ids:
+                if msg_id not in fetched:
+                    try:
+                        fetched[msg_id] = _get(msg_id).execute() or {}
+                    except HttpError:
+                        # e.g. deleted since listing, or still rate limited: skip only this message
+                        continue
             results: List[Dict[str, Any]] = []
-            for m in messages:
-                msg = self.service.users().messages().get(userId=user_id, id=m.get("id"), format="metadata", metadataHeaders=["Subject"]).execute() or {}
+            for msg_id in ids:
+                msg = fetched.get(msg_id)
+                if msg is None:
+                    continue
                 headers = {h.get("name"): h.get("value") for h in (msg.get("payload", {}).get("headers", []) or [])}
                 results.append({
                     "id": msg.get("id"),
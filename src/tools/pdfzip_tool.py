@@ -1,12 +1,84 @@
 from __future__ import annotations
 
 import io
-import json
+import tarfile
 import zipfile
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 import hashlib
 
+from src.tools.filesystem_tool import dumps_json
+
+# Optional Zstandard codec, only needed for fmt="tar.zst" packages
+try:  # pragma: no cover
+    import pyzstd  # type: ignore
+except Exception:  # pragma: no cover
+    pyzstd = None  # type: ignore
+
+
+# Large, repetitive members are worth a higher DEFLATE level; the rest use the archive default
+MEMBER_COMPRESSLEVEL = {"artifacts.json": 9, "audit_log.json": 9}
+
+
+# Fixed member timestamp (the earliest a zip can store) so identical content yields an identical archive
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)
+
+
+def _zip_info(name: str, compress_type: int) -> zipfile.ZipInfo:
+    zi = zipfile.ZipInfo(name, date_time=ZIP_EPOCH)
+    zi.compress_type = compress_type
+    # Same permissions writestr gives a member added by name
+    zi.external_attr = 0o600 << 16
+    return zi
+
+
+# Zstandard level for tar.zst packages; already smaller and faster than DEFLATE at zip's levels
+ZSTD_LEVEL = 3
+
+
+def _checksummed(payloads: Iterable[Tuple[str, bytes]], lines: List[str]) -> Iterator[Tuple[str, bytes]]:
+    """Pass payloads through, appending a `sha256sum`-style line for each to `lines`."""
+    for name, data in payloads:
+        lines.append(f"{hashlib.sha256(data).hexdigest()}  {name}\n")
+        yield name, data
+
+
+def _write_zip(buf: io.BytesIO, payloads: Iterable[Tuple[str, bytes]]) -> None:
+    lines: List[str] = []
+    with zipfile.ZipFile(buf, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=3) as zf:
+        for name, data in _checksummed(payloads, lines):
+            # A ZipInfo does not inherit the archive's compresslevel, so it is always passed explicitly
+            zf.writestr(
+                _zip_info(name, zipfile.ZIP_DEFLATED),
+                data,
+                compresslevel=MEMBER_COMPRESSLEVEL.get(name, zf.compresslevel),
+            )
+        # A few short lines: compressing would only add overhead
+        zf.writestr(_zip_info("checksum.txt", zipfile.ZIP_STORED), "".join(lines).encode("utf-8"))
+
+
+def _add_tar_member(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    # mtime stays 0 so identical content yields an identical archive, as with the zip
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = 0o600
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _write_tar_zst(buf: io.BytesIO, payloads: Iterable[Tuple[str, bytes]]) -> None:
+    if pyzstd is None:
+        raise RuntimeError("pyzstd is required for tar.zst disclosure packages")
+    lines: List[str] = []
+    # The tar stream is compressed as it is written instead of being built uncompressed first
+    with pyzstd.ZstdFile(buf, mode="w", level_or_option=ZSTD_LEVEL) as zst:
+        with tarfile.open(fileobj=zst, mode="w") as tar:
+            for name, data in _checksummed(payloads, lines):
+                _add_tar_member(tar, name, data)
+            _add_tar_member(tar, "checksum.txt", "".join(lines).encode("utf-8"))
+
+
+_WRITERS = {"zip": _write_zip, "tar.zst": _write_tar_zst}
+
 
 def write_disclosure_zip(
     output_path: str,
@@ -15,28 +87,37 @@ def write_disclosure_zip(
     audit: Optional[List[Dict[str, Any]]] = None,
     policy: Optional[Dict[str, Any]] = None,
     approvals: Optional[Dict[str, Any]] = None,
+    pretty: bool = True,
+    fmt: str = "zip",
 ) -> str:
+    """Write the disclosure package to output_path and return the path.
+
+    Only summary.json is meant for people and is indented when `pretty` is set; the other
+    members are machine-read and written compactly. checksum.txt holds one `sha256sum`-style
+    line (`<hex>  <name>`) per member, so the extracted files can be checked with
+    `sha256sum -c checksum.txt`.
+
+    `fmt` selects the container: "zip" (default) or "tar.zst", a Zstandard-compressed tar
+    that needs pyzstd. The members and checksum are the same either way.
+    """
+    writer = _WRITERS.get(fmt)
+    if writer is None:
+        raise ValueError(f"Unsupported disclosure package format: {fmt}")
     out = Path(output_path)
     out.parent.mkdir(parents=True, exist_ok=True)
-    with zipfile.ZipFile(out, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("summary.json", json.dumps(package, indent=2))
-        zf.writestr("artifacts.json", json.dumps(artifacts, indent=2))
-        if audit is not None:
-            zf.writestr("audit_log.json", json.dumps(audit, indent=2))
-        if policy is not None:
-            zf.writestr("policy_snapshot.json", json.dumps(policy, indent=2))
-        if approvals is not None:
-            zf.writestr("approvals.json", json.dumps(approvals, indent=2))
-    # Compute checksum of the written zip and embed it inside as checksum.txt
-    sha256_hex: str
-    with out.open("rb") as rf:
-        hasher = hashlib.sha256()
-        for chunk in iter(lambda: rf.read(8192), b""):
-            hasher.update(chunk)
-        sha256_hex = hasher.hexdigest()
-    with zipfile.ZipFile(out, mode="a", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("checksum.txt", sha256_hex)
+    # (member name, payload, indent); optional payloads that were not supplied are skipped
+    members = [
+        ("summary.json", package, pretty),
+        ("artifacts.json", artifacts, False),
+        ("audit_log.json", audit, False),
+        ("policy_snapshot.json", policy, False),
+        ("approvals.json", approvals, False),
+    ]
+    # Encoded one member at a time as the writer consumes them, so at most one uncompressed
+    # member is held alongside the compressed archive
+    payloads = ((name, dumps_json(obj, indent)) for name, obj, indent in members if obj is not None)
+    # Build the archive in memory so it is written to disk exactly once, without copying the buffer
+    buf = io.BytesIO()
+    writer(buf, payloads)
+    out.write_bytes(buf.getbuffer())
     return str(out)
-
-
-
@@ -1,33 +1,256 @@
 from __future__ import annotations
 
+import bisect
+import functools
+import itertools
+import os
 import re
-from typing import Dict, List
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+# Optional Hyperscan engine for multi-document prefiltering; falls back to `re` if unavailable
+try:  # pragma: no cover
+    import hyperscan  # type: ignore
+except Exception:  # pragma: no cover
+    hyperscan = None  # type: ignore
 
 
 EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
-PHONE_RE = re.compile(r"\+?\d[\d\-\.\s]{7,}\d")
-ADDRESS_HINTS = ["street", "ave", "road", "rd", "st "]
-
-
-def detect(text: str) -> List[Dict[str, object]]:
-    findings: List[Dict[str, object]] = []
-    for m in EMAIL_RE.finditer(text):
-        findings.append({"pii_type": "email", "value": m.group(0), "start": m.start(), "end": m.end(), "confidence": 0.99})
-    for m in PHONE_RE.finditer(text):
-        findings.append({"pii_type": "phone", "value": m.group(0), "start": m.start(), "end": m.end(), "confidence": 0.9})
-    low = text.lower()
-    if any(h in low for h in ADDRESS_HINTS):
-        findings.append({"pii_type": "address", "value": "<context>", "start": 0, "end": 0, "confidence": 0.6})
+PHONE_RE = re.compile(r"(?<![\w+])\+?\d[\d\-\.\s]{7,}\d\b")
+ADDRESS_HINTS = ["street", "ave", "road", "rd", "st"]
+# Whole-word, case-insensitive match of any hint in one scan, without lowercasing a copy of the text
+ADDRESS_RE = re.compile(r"\b(?:%s)\b" % "|".join(ADDRESS_HINTS), re.IGNORECASE)
+CONFIDENCE = {"email": 0.99, "phone": 0.9}
+_DIGIT_RE = re.compile(r"\d")
+
+
+class Finding:
+    """A detected PII span. `value` is sliced from the source text on first access, so
+    callers that only need types, offsets or counts never allocate the substrings."""
+
+    __slots__ = ("pii_type", "_text", "start", "end", "confidence", "_value")
+
+    def __init__(
+        self,
+        pii_type: str,
+        text: str,
+        start: int,
+        end: int,
+        confidence: float,
+        value: Optional[str] = None,
+    ) -> None:
+        self.pii_type = pii_type
+        self._text = text
+        self.start = start
+        self.end = end
+        self.confidence = confidence
+        self._value = value
+
+    @property
+    def value(self) -> str:
+        if self._value is None:
+            self._value = self._text[self.start:self.end]
+        return self._value
+
+    def _fields(self) -> tuple:
+        return (self.pii_type, self.value, self.start, self.end, self.confidence)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Finding):
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    def __hash__(self) -> int:
+        return hash(self._fields())
+
+    def __repr__(self) -> str:
+        return "Finding(pii_type=%r, value=%r, start=%r, end=%r, confidence=%r)" % self._fields()
+
+
+# Address hints carry no span; the finding stands for the whole text
+_ADDRESS_FINDING = Finding("address", "", 0, 0, 0.6, value="<context>")
+# Separates documents in the concatenated Hyperscan buffer; no pattern can match across it
+_SENTINEL = b"\x00"
+# (pattern, what a hit makes worth checking with `re`, caseless)
+_EMAIL, _PHONE, _ADDRESS = 1, 2, 4
+# Hyperscan's UCP \s leaves out \x1c-\x1f, which Python's \s includes; without widening its copy
+# of the pattern, "555\x1c123\x1c4567" would be a phone for `re` but never reach it
+_HS_PHONE_PATTERN = PHONE_RE.pattern.replace(r"\s", r"\s\x1c-\x1f")
+_HS_PATTERNS = [
+    (EMAIL_RE.pattern, _EMAIL, False),
+    (_HS_PHONE_PATTERN, _PHONE, False),
+    (ADDRESS_RE.pattern, _ADDRESS, True),
+]
+
+
+def _compile_hyperscan() -> Optional[object]:
+    if hyperscan is None:
+        return None
+    try:
+        db = hyperscan.Database()
+        # Prefilter mode reports a superset of what the pattern matches, and the patterns above are
+        # written so that Hyperscan matches at least what `re` does; exact results come from `re`
+        base = hyperscan.HS_FLAG_PREFILTER | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+        db.compile(
+            expressions=[p.encode("utf-8") for p, _, _ in _HS_PATTERNS],
+            ids=list(range(len(_HS_PATTERNS))),
+            elements=len(_HS_PATTERNS),
+            flags=[base | (hyperscan.HS_FLAG_CASELESS if caseless else 0) for _, _, caseless in _HS_PATTERNS],
+        )
+        return db
+    except Exception:  # pragma: no cover
+        return None
+
+
+_HS_DB = _compile_hyperscan()
+# Hyperscan scratch space is single-user; each thread scans with its own
+_hs_local = threading.local()
+# detect_batch only fans out when every worker gets at least this many texts
+MIN_TEXTS_PER_WORKER = 64
+
+
+def _hs_scratch() -> object:
+    scratch = getattr(_hs_local, "scratch", None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_HS_DB)
+    return scratch
+
+
+def _candidate_masks(texts: List[str]) -> Optional[List[int]]:
+    """One Hyperscan pass over all texts; per text, a bitmask of _EMAIL/_PHONE/_ADDRESS worth checking.
+
+    Returns None if Hyperscan is unavailable.
+    """
+    if _HS_DB is None:
+        return None
+    chunks = [t.encode("utf-8", "replace") for t in texts]
+    # Cumulative end offset of each chunk including its trailing sentinel
+    ends = list(itertools.accumulate(len(c) + 1 for c in chunks))
+    masks = [0] * len(texts)
+    kinds = [kind for _, kind, _ in _HS_PATTERNS]
+
+    def on_match(pattern_id: int, start: int, end: int, flags: int, context: object) -> None:
+        masks[bisect.bisect_right(ends, end - 1)] |= kinds[pattern_id]
+
+    try:
+        _HS_DB.scan(_SENTINEL.join(chunks), match_event_handler=on_match, scratch=_hs_scratch())  # type: ignore[attr-defined]
+    except Exception:  # pragma: no cover
+        return None
+    return masks
+
+
+def _address_findings(text: str) -> List[Finding]:
+    return [_ADDRESS_FINDING] if ADDRESS_RE.search(text) else []
+
+
+def _span_findings(text: str, kinds: int, materialize_values: bool = False) -> List[Finding]:
+    """Email and phone findings ordered by start, for the _EMAIL/_PHONE bits set in `kinds`.
+
+    Emails are scanned first; phones are then matched only in the gaps between them. Digits
+    inside an email are therefore never also a phone, and a phone-like digit run can no longer
+    swallow the start of a following email (as a single union pattern would).
+    """
+    spans = [("email", *m.span()) for m in EMAIL_RE.finditer(text)] if kinds & _EMAIL else []
+    if kinds & _PHONE:
+        phones = []
+        pos = 0
+        for _, start, end in spans + [("", len(text), len(text))]:
+            phones.extend(("phone", *m.span()) for m in PHONE_RE.finditer(text, pos, start))
+            pos = end
+        spans = sorted(spans + phones, key=lambda span: span[1]) if spans else phones
+    return [
+        Finding(pii_type, text, start, end, CONFIDENCE[pii_type], text[start:end] if materialize_values else None)
+        for pii_type, start, end in spans
+    ]
+
+
+def _findings(text: str, mask: int, materialize_values: bool = False) -> List[Finding]:
+    spans = mask & (_EMAIL | _PHONE)
+    findings = _span_findings(text, spans, materialize_values) if spans else []
+    if mask & _ADDRESS:
+        findings.extend(_address_findings(text))
     return findings
 
 
+def _fallback_mask(text: str) -> int:
+    """Cheap C-level pretests: every email contains '@' and every phone contains a digit."""
+    mask = _ADDRESS
+    if "@" in text:
+        mask |= _EMAIL
+    if _DIGIT_RE.search(text) is not None:
+        mask |= _PHONE
+    return mask
+
+
+def detect(text: str, materialize_values: bool = False) -> List[Finding]:
+    """Detect PII in one text. Pass `materialize_values=True` when every `value` will be
+    read anyway (e.g. masking each finding) to slice them all up front.
+
+    >>> [(f.pii_type, f.value) for f in detect("tel 5551234567 123@example.com")]
+    [('phone', '5551234567'), ('email', '123@example.com')]
+    >>> [(f.pii_type, f.value) for f in detect("phone: 555 123 4567 99@corp.io")]
+    [('phone', '555 123 4567'), ('email', '99@corp.io')]
+    >>> [(f.pii_type, f.value) for f in detect("id 12345678901@example.com")]
+    [('email', '12345678901@example.com')]
+    """
+    masks = _candidate_masks([text])
+    mask = masks[0] if masks is not None else _fallback_mask(text)
+    return _findings(text, mask, materialize_values)
+
+
+def _detect_shard(texts: List[str], materialize_values: bool = False) -> List[List[Finding]]:
+    masks = _candidate_masks(texts)
+    if masks is None:
+        masks = [_fallback_mask(t) for t in texts]
+    return [_findings(text, mask, materialize_values) for text, mask in zip(texts, masks)]
+
+
+def detect_batch(
+    texts: List[str], max_workers: Optional[int] = None, materialize_values: bool = False
+) -> List[List[Finding]]:
+    """Detect PII across many documents, returning one findings list per input text.
+
+    With Hyperscan installed, one scan over the concatenated documents (email, phone and
+    address patterns together) selects the texts worth running the exact `re` passes on;
+    otherwise a cheap character check skips texts that cannot contain an email or phone.
+
+    Large batches are split into contiguous shards scanned on a thread pool, where the
+    Hyperscan scans can overlap; `max_workers` defaults to the CPU count, and batches
+    too small to give each worker MIN_TEXTS_PER_WORKER texts are processed inline.
+
+    Finding values are sliced lazily unless `materialize_values` is set, as in `detect`.
+    """
+    workers = min(max_workers or os.cpu_count() or 1, len(texts) // MIN_TEXTS_PER_WORKER)
+    if workers <= 1:
+        return _detect_shard(texts, materialize_values)
+    size = -(-len(texts) // workers)
+    shards = [texts[i:i + size] for i in range(0, len(texts), size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return [findings for shard in pool.map(functools.partial(_detect_shard, materialize_values=materialize_values), shards) for findings in shard]
+
+
 def mask_value(pii_type: str, value: str) -> str:
     if pii_type == "email":
-        parts = value.split("@")
-        return f"{parts[0][:2]}***@{parts[1]}" if len(parts) == 2 else "***"
+        local, sep, domain = value.partition("@")
+        # Exactly one '@' is maskable; anything else is hidden entirely
+        return local[:2] + "***@" + domain if sep and "@" not in domain else "***"
     if pii_type == "phone":
         return "***" + value[-4:]
     return "[REDACTED]"
 
 
+def mask_all(text: str) -> str:
+    """Mask every email and phone in `text`, with the same spans detect() reports.
 
+    >>> mask_all("tel 5551234567 123@example.com")
+    'tel ***4567 12***@example.com'
+    """
+    parts: List[str] = []
+    pos = 0
+    for f in _span_findings(text, _EMAIL | _PHONE, materialize_values=True):
+        parts.append(text[pos:f.start])
+        parts.append(mask_value(f.pii_type, f.value))
+        pos = f.end
+    parts.append(text[pos:])
+    return "".join(parts)